@@ -1,5 +1,8 @@
 from flask import jsonify, request
 import db_operations
+from services.als_foldin import fold_in_user_safely
+from services import movie_catalog, movie_stats
+import pandas as pd
 from decimal import Decimal
 import json
 def get_main_carousel_movies():
@@ -111,6 +114,14 @@ def get_movie_average_rating(movie_id):
     return jsonify({"movie_id": movie_id, "avg_rating": float(avg_rating[0])})
 
 
+def get_movie_rating_stats(movie_id):
+    stats = movie_stats.get_movie_stats(movie_id)
+    if stats is None:
+        return jsonify({"movie_id": movie_id, "ratings_count": 0}), 404
+
+    return jsonify(stats)
+
+
 def get_movie_trailer(movie_id):
     trailers = db_operations.fetch_movie_trailer(movie_id)
     if not trailers:
@@ -119,25 +130,33 @@ def get_movie_trailer(movie_id):
     trailer_list = [trailer[0] for trailer in trailers]
     return jsonify({"movie_id": movie_id, "trailers": trailer_list})
 
+def _json_value(value):
+    # 紧凑目录中的缺失值是 NaN/NA，转换为 None 以便序列化
+    return None if pd.isna(value) else value
+
 def get_all_categories():
-    categories = db_operations.fetch_all_categories()
+    categories = movie_catalog.all_categories()
     return jsonify(categories)
 
 def get_movies_by_category(category):
     category = category.replace('_', ' ')
-    movies = db_operations.fetch_movies_by_category(category)
+    movies = movie_catalog.movies_in_category(category)
+    if movies is None:
+        return jsonify({"error": "Category not found"}), 404
+
+    avg_ratings = db_operations.fetch_average_ratings([int(movie_id) for movie_id in movies['movie_id']])
     movie_list = []
-    for movie in movies:
+    for movie in movies.itertuples(index=False):
         movie_dict = {
-            "movie_id": movie[0],
-            "movie_title": movie[1],
-            "release_date": movie[2],
-            "IMDb_URL": movie[3],
-            "poster_url": movie[4],
-            "overview": movie[5],
-            "director": movie[6],
-            "cast": movie[7],
-            "avg_rating": float(movie[8])  # 将平均评分转换为浮点数
+            "movie_id": int(movie.movie_id),
+            "movie_title": _json_value(movie.movie_title),
+            "release_date": _json_value(movie.release_date),
+            "IMDb_URL": _json_value(movie.IMDb_URL),
+            "poster_url": _json_value(movie.poster_url),
+            "overview": _json_value(movie.overview),
+            "director": _json_value(movie.director),
+            "cast": _json_value(movie.cast),
+            "avg_rating": float(avg_ratings.get(int(movie.movie_id), 0))  # 将平均评分转换为浮点数
         }
         movie_list.append(movie_dict)
     return jsonify(movie_list)
@@ -231,6 +250,7 @@ def update_favorite_movies():
         return jsonify({"error": "Invalid input"}), 400
 
     db_operations.update_favorite_movies(user_id, favorite_movies)
+    fold_in_user_safely(user_id, implicit_only=True)
     return jsonify({"message": "Favorite movies updated successfully"})
 
 
@@ -243,6 +263,7 @@ def remove_favorite_movie():
         return jsonify({"error": "Invalid input"}), 400
 
     db_operations.remove_favorite_movie(user_id, movie_id)
+    fold_in_user_safely(user_id, implicit_only=True)
     return jsonify({"message": "Favorite movie removed successfully"})
 
 
@@ -294,6 +315,10 @@ def add_movie_rating():
         return jsonify({"error": "Invalid input"}), 400
 
     db_operations.add_movie_rating(user_id, movie_id, rating)
+
+    # 增量更新该用户的协同过滤推荐，失败不影响评分写入
+    fold_in_user_safely(user_id)
+
     return jsonify({"message": "Rating added successfully"})
 
 
@@ -1,6 +1,7 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import logging
+import threading
 import api_responses
 from services.genre_distribution import genre_distribution_api
 from services.rating_trend import rating_trend_api
@@ -8,13 +9,21 @@ from services.viewing_frequency import viewing_frequency_api
 from services.viewing_time_period import viewing_frequency_by_time_period_api
 from services.viewing_person import most_watched_directors_actors_api
 from services.content_recommendation import content_based_recommendation
-from services.hybrid_recommendation import hybrid_recommendation
+from services.hybrid_recommendation import hybrid_recommendation, branch_stats, warm_up
+from services.item_cf_recommendation import item_cf_recommendation
+from services.batch_recommendation import batch_content_recommendation
+from services.candidate_pipeline import pipeline_recommendation, stage_stats
 from services.feedback import update_feedback
 from services.conversational_qa import get_system_initiative, get_user_initiative
+from services import model_store, recommendation_cache
+from services.als_foldin import fold_in_user_safely
 
 app = Flask(__name__)
 CORS(app)
 
+# 后台预热目录、画像表、冷启动推荐层和 ALS 模型，第一批请求不需要在分支预算内承担这些开销
+threading.Thread(target=warm_up, name='hybrid-warm-up', daemon=True).start()
+
 @app.route('/api/main_carousel_movies', methods=['GET'])
 def main_carousel_movies():
     return api_responses.get_main_carousel_movies()
@@ -44,6 +53,10 @@ def movie_details(movie_id):
 def movie_ratings(movie_id):
     return api_responses.get_movie_average_rating(movie_id)
 
+@app.route('/api/ratings/<int:movie_id>/stats', methods=['GET'])
+def movie_rating_stats(movie_id):
+    return api_responses.get_movie_rating_stats(movie_id)
+
 @app.route('/api/trailer/<int:movie_id>', methods=['GET'])
 def movie_trailer(movie_id):
     return api_responses.get_movie_trailer(movie_id)
@@ -126,18 +139,111 @@ def most_watched_directors_actors(user_id):
 
 @app.route('/user/<int:user_id>/content_based_recommendation')
 def content_based_recommendation_route(user_id):
-    recommendations = content_based_recommendation(user_id)
-    return jsonify(recommendations.to_dict(orient='records'))
+    recommendations = recommendation_cache.get_or_compute(
+        user_id, 'content', lambda: content_based_recommendation(user_id).to_dict(orient='records'))
+    return jsonify(recommendations)
+
+def _hybrid_result(user_id):
+    recommendations = hybrid_recommendation(user_id)
+    return {'records': recommendations.to_dict(orient='records'),
+            'dropped_branches': dict(recommendations.attrs.get('dropped_branches', {}))}
 
 @app.route('/user/<int:user_id>/hybrid_recommendation', methods=['GET'])
 def hybrid_recommendation_route(user_id):
     try:
-        recommendations = hybrid_recommendation(user_id)
-        return jsonify(recommendations.to_dict(orient='records'))
+        result = recommendation_cache.get_or_compute(
+            user_id, 'hybrid', lambda: _hybrid_result(user_id), should_cache=lambda result: not result['dropped_branches'])
+        # 超时或失败被丢弃的分支放在响应头中，响应体保持为推荐列表
+        response = jsonify(result['records'])
+        response.headers['X-Dropped-Branches'] = ','.join(f"{name}:{reason}" for name, reason in result['dropped_branches'].items())
+        return response
     except Exception as e:
         logging.error(f"Error in hybrid_recommendation_route: {str(e)}")
         return str(e), 500
 
+@app.route('/user/<int:user_id>/pipeline_recommendation', methods=['GET'])
+def pipeline_recommendation_route(user_id):
+    try:
+        recommendations = recommendation_cache.get_or_compute(
+            user_id, 'pipeline', lambda: pipeline_recommendation(user_id).to_dict(orient='records'))
+        return jsonify(recommendations)
+    except Exception as e:
+        logging.error(f"Error in pipeline_recommendation_route: {str(e)}")
+        return str(e), 500
+
+@app.route('/api/batch_recommendations', methods=['POST'])
+def batch_recommendations():
+    data = request.json or {}
+    user_ids = data.get('user_ids')
+    top_n = data.get('top_n', 6)
+
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, int) for user_id in user_ids) \
+            or not isinstance(top_n, int) or top_n <= 0:
+        return jsonify({'status': 'error', 'message': 'Invalid input'}), 400
+
+    try:
+        recommendations = batch_content_recommendation(user_ids, top_n)
+        return jsonify({str(user_id): movies for user_id, movies in recommendations.items()})
+    except Exception as e:
+        logging.error(f"Error in batch_recommendations: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/user/<int:user_id>/item_cf_recommendation', methods=['GET'])
+def item_cf_recommendation_route(user_id):
+    try:
+        recommendations = item_cf_recommendation(user_id)
+        return jsonify(recommendations.to_dict(orient='records'))
+    except Exception as e:
+        logging.error(f"Error in item_cf_recommendation_route: {str(e)}")
+        return str(e), 500
+
+@app.route('/api/admin/retrain_als', methods=['POST'])
+def retrain_als():
+    started = model_store.trigger_retrain()
+    if not started:
+        return jsonify({'status': 'running', 'message': 'ALS retraining already in progress'}), 409
+    return jsonify({'status': 'started', 'message': 'ALS retraining started in background'}), 202
+
+@app.route('/api/admin/model', methods=['GET'])
+def live_model():
+    live = model_store.get_live()
+    return jsonify({
+        'live_version': live['version'] if live else None,
+        'loaded_at': live['loaded_at'] if live else None,
+        'metadata': live['metadata'] if live else None,
+        'published_version': model_store.latest_version(),
+        'retraining': model_store.is_retraining(),
+        'versions': model_store.list_models(),
+    })
+
+@app.route('/api/admin/model/rollback', methods=['POST'])
+def rollback_model():
+    data = request.json or {}
+    version = data.get('version')
+    if version is not None and (not isinstance(version, int) or version not in model_store.list_versions()):
+        return jsonify({'status': 'error', 'message': 'Unknown model version'}), 404
+
+    try:
+        activated = model_store.rollback(version)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error rolling back ALS model: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    if activated is None:
+        return jsonify({'status': 'error', 'message': 'No earlier model version to roll back to'}), 409
+    return jsonify({'status': 'success', 'live_version': model_store.get_loaded_version()})
+
+@app.route('/api/admin/recommendation_cache', methods=['GET'])
+def recommendation_cache_stats():
+    return jsonify(recommendation_cache.stats())
+
+@app.route('/api/admin/hybrid_branches', methods=['GET'])
+def hybrid_branches_stats():
+    return jsonify(branch_stats())
+
+@app.route('/api/admin/pipeline_stages', methods=['GET'])
+def pipeline_stages_stats():
+    return jsonify(stage_stats())
+
 @app.route('/api/feedback', methods=['POST'])
 def handle_feedback():
     data = request.json
@@ -150,6 +256,7 @@ def handle_feedback():
 
     try:
         update_feedback(user_id, movie_id, feedback)
+        fold_in_user_safely(user_id, implicit_only=True)
         return jsonify({'status': 'success', 'message': 'Feedback recorded successfully'}), 200
     except Exception as e:
         logging.error(f"Error updating feedback: {e}")
@@ -1,6 +1,7 @@
 import pymysql
 import bcrypt
 from datetime import datetime
+from services import user_profiles, recommendation_cache, content_precompute, movie_stats, movie_catalog
 def get_db_connection():
     return pymysql.connect(
         host="localhost",
@@ -11,58 +12,43 @@ def get_db_connection():
         autocommit=True
     )
 
+# 首页卡片列表直接从进程内电影目录取，不访问数据库
 def fetch_main_carousel_movies():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT movie_id, movie_title, poster_url FROM movies ORDER BY RAND() LIMIT 5")
-    movies = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return movies
+    return movie_catalog.random_cards(5)
 
 def fetch_recommended_movies():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT movie_id, movie_title, poster_url FROM movies ORDER BY RAND() LIMIT 6")
-    movies = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return movies
+    return movie_catalog.random_cards(6)
 
 def fetch_latest_movies():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT movie_id, movie_title, poster_url FROM movies ORDER BY release_date DESC LIMIT 6")
-    movies = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return movies
+    return movie_catalog.latest_cards(6)
 
 def fetch_highest_rated_movies():
+    # 按贝叶斯平均排序，只有一两个高分评分的电影不会排在前面
+    movie_stats.ensure_table()
+    rank_sql, rank_params = movie_stats.weighted_rank_sql('s')
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT m.movie_id, m.movie_title, m.poster_url, AVG(r.rating) as avg_rating
-        FROM movies m
-        JOIN ratings r ON m.movie_id = r.movie_id
-        GROUP BY m.movie_id, m.movie_title, m.poster_url
-        ORDER BY avg_rating DESC
+    cursor.execute(f"""
+        SELECT m.movie_id, m.movie_title, m.poster_url, s.avg_rating
+        FROM movie_rating_stats s
+        JOIN movies m ON m.movie_id = s.movie_id
+        ORDER BY {rank_sql} DESC
         LIMIT 6
-    """)
+    """, rank_params)
     movies = cursor.fetchall()
     cursor.close()
     conn.close()
     return movies
 
 def fetch_all_rated_movies():
+    movie_stats.ensure_table()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT m.movie_id, m.movie_title, m.poster_url, AVG(r.rating) as avg_rating
-        FROM movies m
-        JOIN ratings r ON m.movie_id = r.movie_id
-        GROUP BY m.movie_id, m.movie_title, m.poster_url
-        ORDER BY avg_rating DESC
+        SELECT m.movie_id, m.movie_title, m.poster_url, s.avg_rating
+        FROM movie_rating_stats s
+        JOIN movies m ON m.movie_id = s.movie_id
+        ORDER BY s.avg_rating DESC
     """)
     movies = cursor.fetchall()
     cursor.close()
@@ -84,11 +70,12 @@ def fetch_movie_details(movie_id):
 
 
 def fetch_movie_average_rating(movie_id):
+    movie_stats.ensure_table()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT AVG(rating) as avg_rating
-        FROM ratings
+        SELECT avg_rating
+        FROM movie_rating_stats
         WHERE movie_id = %s
     """, (movie_id,))
     avg_rating = cursor.fetchone()
@@ -110,63 +97,23 @@ def fetch_movie_trailer(movie_id):
     return trailers
 
 
-def fetch_all_categories():
+def fetch_average_ratings(movie_ids):
+    # 只读取指定电影的统计，返回 {movie_id: avg_rating}
+    if not movie_ids:
+        return {}
+    movie_stats.ensure_table()
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT category
-        FROM (
-            SELECT 'Action' AS category FROM movies WHERE Action = 1
-            UNION SELECT 'Adventure' FROM movies WHERE Adventure = 1
-            UNION SELECT 'Animation' FROM movies WHERE Animation = 1
-            UNION SELECT 'Comedy' FROM movies WHERE Comedy = 1
-            UNION SELECT 'Crime' FROM movies WHERE Crime = 1
-            UNION SELECT 'Documentary' FROM movies WHERE Documentary = 1
-            UNION SELECT 'Drama' FROM movies WHERE Drama = 1
-            UNION SELECT 'Family' FROM movies WHERE Family = 1
-            UNION SELECT 'Fantasy' FROM movies WHERE Fantasy = 1
-            UNION SELECT 'History' FROM movies WHERE History = 1
-            UNION SELECT 'Horror' FROM movies WHERE Horror = 1
-            UNION SELECT 'Music' FROM movies WHERE Music = 1
-            UNION SELECT 'Mystery' FROM movies WHERE Mystery = 1
-            UNION SELECT 'Romance' FROM movies WHERE Romance = 1
-            UNION SELECT 'Science Fiction' FROM movies WHERE `Science Fiction` = 1
-            UNION SELECT 'TV Movie' FROM movies WHERE `TV Movie` = 1
-            UNION SELECT 'Thriller' FROM movies WHERE Thriller = 1
-            UNION SELECT 'War' FROM movies WHERE War = 1
-            UNION SELECT 'Western' FROM movies WHERE Western = 1
-        ) AS categories
-    """)
-    categories = cursor.fetchall()
+    placeholders = ', '.join(['%s'] * len(movie_ids))
+    cursor.execute(f"""
+        SELECT movie_id, avg_rating
+        FROM movie_rating_stats
+        WHERE movie_id IN ({placeholders})
+    """, tuple(movie_ids))
+    avg_ratings = dict(cursor.fetchall())
     cursor.close()
     conn.close()
-    return [category[0] for category in categories]
-
-
-def fetch_movies_by_category(category):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = f"""
-            SELECT 
-                m.movie_id, 
-                m.movie_title, 
-                m.release_date, 
-                m.IMDb_URL, 
-                m.poster_url, 
-                m.overview, 
-                m.director, 
-                m.cast,
-                IFNULL(AVG(r.rating), 0) as avg_rating
-            FROM movies m
-            LEFT JOIN ratings r ON m.movie_id = r.movie_id
-            WHERE m.`{category}` = 1
-            GROUP BY m.movie_id, m.movie_title, m.release_date, m.IMDb_URL, m.poster_url, m.overview, m.director, m.cast
-        """
-    cursor.execute(query)
-    movies = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return movies
+    return avg_ratings
 
 def check_user_credentials(username, password):
     conn = get_db_connection()
@@ -205,6 +152,9 @@ def update_user_preferred_genres(user_id, preferred_genres):
     conn.commit()
     cursor.close()
     conn.close()
+    user_profiles.set_preferred_genres(user_id, preferred_genres)
+    recommendation_cache.invalidate_user(user_id)
+    content_precompute.invalidate_user(user_id)
 
 
 def get_user_info(user_id):
@@ -242,6 +192,9 @@ def update_user_info(user_id, username, password, email, preferred_genres):
     conn.commit()
     cursor.close()
     conn.close()
+    user_profiles.set_preferred_genres(user_id, preferred_genres)
+    recommendation_cache.invalidate_user(user_id)
+    content_precompute.invalidate_user(user_id)
 
 def get_favorite_movies(user_id):
     conn = get_db_connection()
@@ -259,6 +212,8 @@ def get_favorite_movies(user_id):
 def update_favorite_movies(user_id, favorite_movies):
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute("SELECT favorite_movies FROM users WHERE user_id = %s", (user_id,))
+    previous = cursor.fetchone()
     cursor.execute("""
         UPDATE users
         SET favorite_movies = %s
@@ -267,6 +222,9 @@ def update_favorite_movies(user_id, favorite_movies):
     conn.commit()
     cursor.close()
     conn.close()
+    user_profiles.update_favorites(user_id, previous[0] if previous else None, favorite_movies)
+    recommendation_cache.invalidate_user(user_id)
+    content_precompute.invalidate_user(user_id)
 
 
 def remove_favorite_movie(user_id, movie_id):
@@ -294,6 +252,9 @@ def remove_favorite_movie(user_id, movie_id):
                 WHERE user_id = %s
             """, (new_favorite_movies, user_id))
             conn.commit()
+            user_profiles.update_favorites(user_id, favorite_movies, new_favorite_movies)
+            recommendation_cache.invalidate_user(user_id)
+            content_precompute.invalidate_user(user_id)
 
     cursor.close()
     conn.close()
@@ -315,12 +276,12 @@ def search_movies(query):
 
 
 def get_ratings_count():
+    movie_stats.ensure_table()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT movie_id, COUNT(*) as ratings_count
-        FROM ratings
-        GROUP BY movie_id
+        SELECT movie_id, rating_count
+        FROM movie_rating_stats
     """)
     ratings_count = cursor.fetchall()
     cursor.close()
@@ -333,11 +294,30 @@ def add_movie_rating(user_id, movie_id, rating):
     conn = get_db_connection()
     cursor = conn.cursor()
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # 重新评分时画像需要减去上一次评分的贡献
     cursor.execute("""
-        INSERT INTO ratings (user_id, movie_id, rating, timestamp)
-        VALUES (%s, %s, %s, %s)
-    """, (user_id, movie_id, rating, timestamp))
-    conn.commit()
-    cursor.close()
-    conn.close()
+        SELECT rating FROM ratings
+        WHERE user_id = %s AND movie_id = %s
+        ORDER BY timestamp DESC LIMIT 1
+    """, (user_id, movie_id))
+    previous = cursor.fetchone()
+    # 评分和电影统计在同一事务中写入
+    movie_stats.ensure_table()
+    conn.begin()
+    try:
+        cursor.execute("""
+            INSERT INTO ratings (user_id, movie_id, rating, timestamp)
+            VALUES (%s, %s, %s, %s)
+        """, (user_id, movie_id, rating, timestamp))
+        movie_stats.record_rating(cursor, movie_id, rating, timestamp)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    user_profiles.record_rating(user_id, movie_id, rating, previous[0] if previous else None)
+    recommendation_cache.invalidate_user(user_id)
+    content_precompute.invalidate_user(user_id)
 
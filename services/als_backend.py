@@ -0,0 +1,39 @@
+import os
+import json
+import importlib
+
+# ALS 训练/推理后端：spark（默认）或 numpy（单机进程内，无需 JVM）
+ALS_BACKEND = os.environ.get('ALS_BACKEND', 'spark')
+
+BACKEND_MODULES = {
+    'spark': 'services.ALSmodel',
+    'numpy': 'services.als_numpy',
+}
+
+# 隐式反馈模式：用评分、喜欢/不喜欢和收藏构建交互矩阵训练（implicitPrefs）
+ALS_IMPLICIT_PREFS = os.environ.get('ALS_IMPLICIT_PREFS', '0') == '1'
+
+# 默认超参数；调参任务（services.als_tuning）保存的最优配置会覆盖它们
+DEFAULT_ALS_PARAMS = {'rank': 10, 'maxIter': 10, 'regParam': 0.1,
+                      'implicitPrefs': ALS_IMPLICIT_PREFS, 'alpha': 1.0}
+TUNING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'tuning')
+BEST_PARAMS_FILE = os.path.join(TUNING_DIR, 'best_params.json')
+
+
+def get_backend(name=None):
+    # 按需导入，选择 numpy 后端时不会加载 pyspark
+    name = name or ALS_BACKEND
+    if name not in BACKEND_MODULES:
+        raise ValueError(f"Unknown ALS backend '{name}', expected one of {sorted(BACKEND_MODULES)}")
+    return importlib.import_module(BACKEND_MODULES[name])
+
+
+def load_als_params():
+    params = dict(DEFAULT_ALS_PARAMS)
+    try:
+        with open(BEST_PARAMS_FILE) as f:
+            tuned = json.load(f)
+    except (OSError, ValueError):
+        return params
+    params.update({key: tuned[key] for key in DEFAULT_ALS_PARAMS if key in tuned})
+    return params
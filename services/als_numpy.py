@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+import numpy as np
+import scipy.sparse as sp
+from concurrent.futures import ThreadPoolExecutor
+from services.als_backend import load_als_params
+from services.interactions import load_interactions
+from services import ratings_snapshot
+from services.shared_arrays import save_arrays, load_arrays
+
+# 单机进程内的显式反馈 ALS，参数含义与 Spark ALS 保持一致
+MODEL_ARTIFACT = 'factors'
+ALS_PARAMS = load_als_params()
+# 训练集 RMSE 的变化小于该值时提前停止迭代
+CONVERGENCE_TOL = 1e-4
+BLOCK_SIZE = 256
+NUM_WORKERS = os.cpu_count() or 1
+
+
+def latest_ratings(ratings):
+    # 重新评分会在 ratings 表中新增一行；输入按时间排序，同一用户对同一电影只保留最近一次评分
+    return ratings.drop_duplicates(subset=['user_id', 'movie_id'], keep='last')
+
+
+def load_ratings():
+    return latest_ratings(ratings_snapshot.load_ratings())
+
+
+def random_split(ratings, weights=(0.8, 0.2), seed=None):
+    rng = np.random.default_rng(seed)
+    mask = rng.random(len(ratings)) < weights[0] / sum(weights)
+    return ratings[mask], ratings[~mask]
+
+
+def build_rating_matrix(ratings, user_ids, item_ids):
+    # 将 (user_id, movie_id, rating) 转为以行号/列号索引的 CSR 矩阵；
+    # 重复的 (user_id, movie_id) 取最后一行而不是相加，CSR 构造时会把重复项累加
+    ratings = latest_ratings(ratings)
+    rows = np.searchsorted(user_ids, ratings['user_id'].values)
+    cols = np.searchsorted(item_ids, ratings['movie_id'].values)
+    return sp.csr_matrix((ratings['rating'].values.astype(np.float64), (rows, cols)),
+                         shape=(len(user_ids), len(item_ids)))
+
+
+def _solve_block(matrix, fixed_factors, reg_param, start, end, implicit_prefs=False, alpha=1.0, gram=None, outer=None):
+    # 对一块行同时求解：(Y_u^T Y_u + λ n_u I) x_u = Y_u^T r_u
+    # 隐式反馈时（Hu-Koren-Volinsky）：(Y^T Y + Y_u^T (C_u - I) Y_u + λ n_u I) x_u = Y_u^T C_u p_u
+    # 正规方程用稀疏矩阵乘法一次得到：A = W @ outer，outer 的第 j 行是 y_j y_j^T 展平，
+    # 整个块不经过逐行的 Python 循环，稀疏乘法、NumPy 运算和 LAPACK 求解期间都释放 GIL
+    rank = fixed_factors.shape[1]
+    block = matrix[start:end]
+    n_rows = end - start
+    counts = np.diff(block.indptr)
+    r = block.data
+
+    def weighted(values):
+        return sp.csr_matrix((values, block.indices, block.indptr), shape=block.shape)
+
+    if implicit_prefs:
+        confidence = 1.0 + alpha * np.abs(r)
+        positive = (r > 0).astype(np.float64)
+        A = (weighted(confidence - 1.0) @ outer).reshape(n_rows, rank, rank) + gram
+        b = weighted(confidence * positive) @ fixed_factors
+        # 与 Spark 一样只按正偏好的数量缩放正则项
+        row_of = np.repeat(np.arange(n_rows), counts)
+        n_regularized = np.maximum(np.bincount(row_of, weights=positive, minlength=n_rows), 1)
+    else:
+        A = (weighted(np.ones(len(r))) @ outer).reshape(n_rows, rank, rank)
+        b = block @ fixed_factors
+        # 与 Spark 一样按评分数量缩放正则项（ALS-WR）
+        n_regularized = counts
+    A += (reg_param * n_regularized)[:, None, None] * np.eye(rank)
+
+    # 没有评分的行解为零向量
+    empty = counts == 0
+    A[empty] = np.eye(rank)
+    b[empty] = 0.0
+    return np.linalg.solve(A, b[..., None])[..., 0]
+
+
+def solve_factors(matrix, fixed_factors, reg_param, executor, implicit_prefs=False, alpha=1.0):
+    # 按块划分行，在线程池中并行求解
+    gram = fixed_factors.T @ fixed_factors if implicit_prefs else None
+    # 每个固定因子的外积 y_j y_j^T，各块共用
+    outer = (fixed_factors[:, :, None] * fixed_factors[:, None, :]).reshape(len(fixed_factors), -1)
+    blocks = [(start, min(start + BLOCK_SIZE, matrix.shape[0])) for start in range(0, matrix.shape[0], BLOCK_SIZE)]
+    results = executor.map(lambda block: _solve_block(matrix, fixed_factors, reg_param, *block,
+                                                      implicit_prefs=implicit_prefs, alpha=alpha, gram=gram,
+                                                      outer=outer), blocks)
+    return np.vstack(list(results)) if blocks else np.zeros((0, fixed_factors.shape[1]))
+
+
+def init_factors(ids, rank, rng, scale, prev_ids=None, prev_factors=None):
+    # 随机初始化；热启动时沿用上一个模型中已有 id 的因子，新 id 使用新的随机行
+    factors = np.abs(rng.normal(scale=scale, size=(len(ids), rank)))
+    if prev_ids is None or len(prev_ids) == 0 or prev_factors.shape[1] != rank:
+        return factors, 0
+
+    index = np.minimum(np.searchsorted(prev_ids, ids), len(prev_ids) - 1)
+    known = prev_ids[index] == ids
+    factors[known] = prev_factors[index[known]]
+    return factors, int(known.sum())
+
+
+def training_rmse(matrix, user_factors, item_factors, implicit_prefs=False):
+    # 隐式反馈时与偏好 p = [r > 0] 比较
+    coo = matrix.tocoo()
+    target = (coo.data > 0).astype(np.float64) if implicit_prefs else coo.data
+    prediction = np.einsum('ij,ij->i', user_factors[coo.row], item_factors[coo.col])
+    return float(np.sqrt(np.mean((target - prediction) ** 2)))
+
+
+def fit_als(ratings, rank=10, max_iter=10, reg_param=0.1, seed=None, init_model=None, tol=CONVERGENCE_TOL,
+            implicit_prefs=False, alpha=1.0):
+    user_ids = np.unique(ratings['user_id'].values)
+    item_ids = np.unique(ratings['movie_id'].values)
+    matrix = build_rating_matrix(ratings, user_ids, item_ids)
+    matrix_t = matrix.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    init_model = init_model or {}
+    user_factors, _ = init_factors(user_ids, rank, rng, 0.01,
+                                   init_model.get('user_ids'), init_model.get('user_factors'))
+    item_factors, n_warm_items = init_factors(item_ids, rank, rng, 1.0 / np.sqrt(rank),
+                                              init_model.get('item_ids'), init_model.get('item_factors'))
+
+    n_iter = 0
+    prev_rmse = None
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        for n_iter in range(1, max_iter + 1):
+            user_factors = solve_factors(matrix, item_factors, reg_param, executor, implicit_prefs, alpha)
+            item_factors = solve_factors(matrix_t, user_factors, reg_param, executor, implicit_prefs, alpha)
+
+            # 热启动时通常几轮就收敛，RMSE 变化足够小即停止
+            current_rmse = training_rmse(matrix, user_factors, item_factors, implicit_prefs)
+            if prev_rmse is not None and abs(prev_rmse - current_rmse) < tol:
+                break
+            prev_rmse = current_rmse
+
+    model = {
+        'user_ids': user_ids.astype(np.int32),
+        'user_factors': user_factors.astype(np.float32),
+        'item_ids': item_ids.astype(np.int32),
+        'item_factors': item_factors.astype(np.float32),
+    }
+    return model, {'iterations': n_iter, 'warm_start_items': n_warm_items}
+
+
+def predict(model, ratings, cold_start_strategy="drop"):
+    # 对训练时未出现的用户/电影：drop 丢弃，nan 预测为 NaN
+    user_index = np.searchsorted(model['user_ids'], ratings['user_id'].values)
+    item_index = np.searchsorted(model['item_ids'], ratings['movie_id'].values)
+    user_index = np.minimum(user_index, len(model['user_ids']) - 1)
+    item_index = np.minimum(item_index, len(model['item_ids']) - 1)
+    known = (model['user_ids'][user_index] == ratings['user_id'].values) & \
+            (model['item_ids'][item_index] == ratings['movie_id'].values)
+
+    prediction = np.full(len(ratings), np.nan)
+    prediction[known] = np.einsum('ij,ij->i', model['user_factors'][user_index[known]],
+                                  model['item_factors'][item_index[known]])
+
+    predictions = ratings.assign(prediction=prediction)
+    if cold_start_strategy == "drop":
+        predictions = predictions[known]
+    return predictions
+
+
+def rmse(predictions):
+    errors = predictions['rating'].values - predictions['prediction'].values
+    return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def als_model_train(init_model=None):
+    start = time.time()
+
+    implicit_prefs = ALS_PARAMS['implicitPrefs']
+
+    # 从数据库加载评分数据；隐式反馈模式下加载合并后的交互数据
+    stage_seconds = {}
+    stage_start = time.time()
+    ratings = load_interactions() if implicit_prefs else load_ratings()
+    stage_seconds['load_data'] = round(time.time() - stage_start, 2)
+
+    # 分割数据为训练集和测试集
+    training, test = random_split(ratings, [0.8, 0.2])
+
+    # 构建ALS模型，有上一个模型时从其因子热启动
+    stage_start = time.time()
+    model, fit_info = fit_als(training, rank=ALS_PARAMS['rank'], max_iter=ALS_PARAMS['maxIter'],
+                              reg_param=ALS_PARAMS['regParam'], init_model=init_model,
+                              implicit_prefs=implicit_prefs, alpha=ALS_PARAMS['alpha'])
+    stage_seconds['fit'] = round(time.time() - stage_start, 2)
+
+    # 在测试集上评估模型（隐式反馈时评估对偏好 p = [r > 0] 的拟合）
+    stage_start = time.time()
+    if implicit_prefs:
+        test = test.assign(rating=(test['rating'] > 0).astype(np.float64))
+    predictions = predict(model, test, cold_start_strategy="drop")
+    test_rmse = rmse(predictions)
+    print(f"Root-mean-square error (RMSE) = {test_rmse}")
+    stage_seconds['evaluate'] = round(time.time() - stage_start, 2)
+
+    metrics = {
+        'rmse': test_rmse,
+        'train_seconds': round(time.time() - start, 2),
+        'warm_start': init_model is not None,
+        'iterations': fit_info['iterations'],
+        'iterations_saved': ALS_PARAMS['maxIter'] - fit_info['iterations'],
+        'warm_start_items': fit_info['warm_start_items'],
+        'stage_seconds': stage_seconds,
+    }
+    logging.info(f"ALS training finished in {metrics['train_seconds']}s, "
+                 f"{metrics['iterations']} iterations ({metrics['iterations_saved']} saved)")
+    return model, metrics
+
+
+def save_als_model(model, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_arrays(path, model)
+
+
+def load_als_model(path):
+    return load_arrays(path, mmap=False)
+
+
+def export_factors(model):
+    return model
+
+
+def als_recommend(user_id, model, n_recommendations=6):
+    i = np.searchsorted(model['user_ids'], user_id)
+    if i >= len(model['user_ids']) or model['user_ids'][i] != user_id:
+        # 与 coldStartStrategy="drop" 一致，模型中没有该用户
+        return []
+
+    scores = model['item_factors'] @ model['user_factors'][i]
+    n_recommendations = min(n_recommendations, len(scores))
+    top = np.argpartition(-scores, n_recommendations - 1)[:n_recommendations]
+    top = top[np.argsort(-scores[top])]
+    return [int(movie_id) for movie_id in model['item_ids'][top]]
+
+
+def als_recommend_all(model, n_recommendations=50):
+    # 分块矩阵乘法为所有用户生成推荐，避免一次性生成完整的用户×电影得分矩阵
+    n_users = len(model['user_ids'])
+    n_top = min(n_recommendations, len(model['item_ids']))
+    movie_ids = np.full((n_users, n_recommendations), -1, dtype=np.int32)
+    scores = np.zeros((n_users, n_recommendations), dtype=np.float32)
+
+    for start in range(0, n_users, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, n_users)
+        block_scores = model['user_factors'][start:end] @ model['item_factors'].T
+        top = np.argpartition(-block_scores, n_top - 1, axis=1)[:, :n_top]
+        top_scores = np.take_along_axis(block_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        movie_ids[start:end, :n_top] = model['item_ids'][top]
+        scores[start:end, :n_top] = np.take_along_axis(top_scores, order, axis=1)
+
+    return model['user_ids'].copy(), movie_ids, scores
+
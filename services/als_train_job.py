@@ -0,0 +1,58 @@
+import time
+import json
+import logging
+import argparse
+from services import model_store
+from services.als_backend import ALS_BACKEND, get_backend
+
+# 独立的 ALS 训练任务：训练、保存产物、预计算 top-N 并发布新版本。
+# Web 进程只通过 model_store.trigger_retrain 以子进程方式启动它，SparkSession 只存在于本进程中
+#   python -m services.als_train_job --cores 8 --shuffle-partitions 16 --num-blocks 8 \
+#       --checkpoint-interval 5 --driver-memory 4g
+
+
+def run(spark_settings=None):
+    start = time.time()
+    backend = get_backend()
+    if ALS_BACKEND == 'spark':
+        backend.configure(**(spark_settings or {}))
+
+    try:
+        version = model_store.train_and_save()
+    finally:
+        if ALS_BACKEND == 'spark':
+            backend.stop_spark()
+
+    if version is None:
+        # 另一个训练任务持有训练锁，由它发布新版本
+        logging.info("ALS training job skipped: another job is already training")
+        return None, {}
+
+    metadata = model_store.read_metadata(version)
+    stage_seconds = metadata['metrics'].get('stage_seconds', {})
+    logging.info(f"ALS training job finished in {time.time() - start:.1f}s, published version {version}")
+    for stage, seconds in stage_seconds.items():
+        logging.info(f"{stage:>16}: {seconds:.2f}s")
+    return version, stage_seconds
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Train, save and publish a new ALS model version")
+    parser.add_argument('--cores', type=int, default=None, help="run Spark as local[N] (default: all cores)")
+    parser.add_argument('--shuffle-partitions', type=int, default=None, help="spark.sql.shuffle.partitions (default: 2 x cores)")
+    parser.add_argument('--num-blocks', type=int, default=None, help="ALS numUserBlocks/numItemBlocks (default: cores)")
+    parser.add_argument('--checkpoint-interval', type=int, default=None, help="ALS checkpointInterval in iterations")
+    parser.add_argument('--checkpoint-dir', default=None)
+    parser.add_argument('--driver-memory', default=None, help="spark.driver.memory, e.g. 4g")
+    args = parser.parse_args()
+
+    version, stage_seconds = run({
+        'cores': args.cores,
+        'shuffle_partitions': args.shuffle_partitions,
+        'num_blocks': args.num_blocks,
+        'checkpoint_interval': args.checkpoint_interval,
+        'checkpoint_dir': args.checkpoint_dir,
+        'driver_memory': args.driver_memory,
+    })
+    print(json.dumps({'version': version, 'stage_seconds': stage_seconds}, indent=2))
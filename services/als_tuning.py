@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+import tracemalloc
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from services import als_numpy
+from services.als_backend import TUNING_DIR, BEST_PARAMS_FILE
+
+# 固定的训练/验证集划分，缓存在磁盘上，保证不同次调参的 RMSE 可以比较
+# v2：切分前按 (user_id, movie_id) 去掉被重新评分覆盖的旧评分，旧的 split.npz 不再使用
+SPLIT_FILE = os.path.join(TUNING_DIR, 'split_v2.npz')
+LEADERBOARD_FILE = os.path.join(TUNING_DIR, 'leaderboard.csv')
+SPLIT_SEED = 42
+
+_split_cache = None
+
+DEFAULT_GRID = {
+    'rank': [5, 10, 20, 40],
+    'regParam': [0.01, 0.05, 0.1, 0.2],
+    'maxIter': [10, 20],
+}
+
+
+def _to_arrays(ratings):
+    return {
+        'user_id': ratings['user_id'].values.astype(np.int32),
+        'movie_id': ratings['movie_id'].values.astype(np.int32),
+        'rating': ratings['rating'].values.astype(np.float32),
+    }
+
+
+def load_or_create_split(resplit=False):
+    if os.path.exists(SPLIT_FILE) and not resplit:
+        with np.load(SPLIT_FILE) as data:
+            training = pd.DataFrame({key[len('train_'):]: data[key] for key in data.files if key.startswith('train_')})
+            validation = pd.DataFrame({key[len('valid_'):]: data[key] for key in data.files if key.startswith('valid_')})
+        return training, validation
+
+    ratings = als_numpy.load_ratings()
+    training, validation = als_numpy.random_split(ratings, [0.8, 0.2], seed=SPLIT_SEED)
+
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    arrays = {f'train_{key}': value for key, value in _to_arrays(training).items()}
+    arrays.update({f'valid_{key}': value for key, value in _to_arrays(validation).items()})
+    np.savez(SPLIT_FILE, **arrays)
+    print(f"Saved train/validation split to {SPLIT_FILE}")
+    return training, validation
+
+
+def grid_configs(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def random_configs(grid, n_trials, seed=SPLIT_SEED):
+    configs = grid_configs(grid)
+    random.Random(seed).shuffle(configs)
+    return configs[:n_trials]
+
+
+def _init_worker():
+    # 每个进程只用一个线程求解，并行度由进程池提供，避免线程过度订阅
+    als_numpy.NUM_WORKERS = 1
+
+
+def _get_split():
+    # 每个工作进程只读取一次缓存的划分
+    global _split_cache
+    if _split_cache is None:
+        _split_cache = load_or_create_split()
+    return _split_cache
+
+
+def evaluate_config(config):
+    training, validation = _get_split()
+
+    tracemalloc.start()
+    start = time.time()
+    model, fit_info = als_numpy.fit_als(training, rank=config['rank'], max_iter=config['maxIter'],
+                                        reg_param=config['regParam'], seed=SPLIT_SEED)
+    train_seconds = time.time() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    predictions = als_numpy.predict(model, validation, cold_start_strategy="drop")
+    return dict(config,
+                rmse=als_numpy.rmse(predictions),
+                iterations=fit_info['iterations'],
+                train_seconds=round(train_seconds, 3),
+                peak_memory_mb=round(peak_bytes / 1024 / 1024, 2))
+
+
+def run_search(configs, workers=None):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        results = list(executor.map(evaluate_config, configs))
+
+    leaderboard = pd.DataFrame(results).sort_values('rmse').reset_index(drop=True)
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    leaderboard.to_csv(LEADERBOARD_FILE, index=False)
+
+    # 保存最优配置，训练任务通过 als_backend.load_als_params() 读取
+    best = leaderboard.iloc[0]
+    best_params = {
+        'rank': int(best['rank']),
+        'maxIter': int(best['maxIter']),
+        'regParam': float(best['regParam']),
+        'rmse': float(best['rmse']),
+        'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(BEST_PARAMS_FILE, 'w') as f:
+        json.dump(best_params, f, indent=2)
+
+    return leaderboard, best_params
+
+
+# 调参入口：python -m services.als_tuning [--random 20] [--workers 8] [--resplit]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ALS hyperparameter search on a fixed train/validation split")
+    parser.add_argument('--ranks', type=int, nargs='+', default=DEFAULT_GRID['rank'])
+    parser.add_argument('--reg-params', type=float, nargs='+', default=DEFAULT_GRID['regParam'])
+    parser.add_argument('--max-iters', type=int, nargs='+', default=DEFAULT_GRID['maxIter'])
+    parser.add_argument('--random', type=int, default=0, help="sample this many configurations instead of the full grid")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes, defaults to all cores")
+    parser.add_argument('--resplit', action='store_true', help="discard the cached split and draw a new one")
+    args = parser.parse_args()
+
+    # 在主进程中先生成（或读取）划分，工作进程只读取缓存文件
+    load_or_create_split(resplit=args.resplit)
+
+    grid = {'rank': args.ranks, 'regParam': args.reg_params, 'maxIter': args.max_iters}
+    configs = random_configs(grid, args.random) if args.random else grid_configs(grid)
+    print(f"Evaluating {len(configs)} ALS configurations")
+
+    leaderboard, best_params = run_search(configs, args.workers)
+    print(leaderboard.to_string(index=False))
+    print(f"Best configuration: {best_params}")
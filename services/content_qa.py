@@ -4,6 +4,7 @@ import pandas as pd
 import pymysql
 from sqlalchemy import create_engine
 from sklearn.metrics.pairwise import cosine_similarity
+from services import movie_stats
 
 # 创建数据库连接
 def get_db_connection():
@@ -119,11 +120,12 @@ def fetch_movie_by_title(title):
     return movie
 
 def fetch_avg_rating_by_movie_id(movie_id):
+    movie_stats.ensure_table()
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT AVG(rating) as avg_rating
-        FROM ratings
+        SELECT avg_rating
+        FROM movie_rating_stats
         WHERE movie_id = %s
     """, (movie_id,))
     avg_rating = cursor.fetchone()
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from services import model_store, movie_catalog
+
+# 进程内推荐结果缓存：键为 (user_id, 推荐类型)，LRU + TTL 淘汰
+# 用户评分、反馈、修改偏好类型或收藏时按用户失效；模型或电影目录发布新版本时整体清空
+MAX_ENTRIES = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', '10000'))
+# TTL 同时限制多进程部署时其他进程中失效延迟的上限
+TTL_SECONDS = float(os.environ.get('RECOMMENDATION_CACHE_TTL', '300'))
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+# 每个用户的失效代数：计算期间用户或版本发生了变化时，算出的结果不写入缓存
+_generations = {}
+_kinds = set()
+_versions = None
+_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'invalidated': 0}
+
+
+def _current_versions():
+    return model_store.latest_version(), movie_catalog.get_catalog()['version']
+
+
+def _check_versions(versions):
+    # 调用方持有 _lock
+    global _versions
+    if versions != _versions:
+        _stats['invalidated'] += len(_entries)
+        _entries.clear()
+        _versions = versions
+
+
+def get(user_id, kind):
+    key = (int(user_id), kind)
+    versions = _current_versions()
+    with _lock:
+        _check_versions(versions)
+        entry = _entries.get(key)
+        if entry is not None and time.time() - entry[1] > TTL_SECONDS:
+            del _entries[key]
+            _stats['expired'] += 1
+            entry = None
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+        return entry[0]
+
+
+def put(user_id, kind, value, generation=None, versions=None):
+    key = (int(user_id), kind)
+    with _lock:
+        if generation is not None and _generations.get(key[0], 0) != generation:
+            return
+        if versions is not None and versions != _versions:
+            return
+        _kinds.add(kind)
+        _entries[key] = (value, time.time())
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats['evicted'] += 1
+
+
+def get_or_compute(user_id, kind, compute, should_cache=None):
+    # 缓存的值会直接返回给多个请求，compute 应返回可序列化、不再修改的结果；
+    # should_cache 返回 False 的结果（如降级结果）只用于本次请求
+    value = get(user_id, kind)
+    if value is not None:
+        return value
+    with _lock:
+        generation = _generations.get(int(user_id), 0)
+        versions = _versions
+    value = compute()
+    if should_cache is None or should_cache(value):
+        put(user_id, kind, value, generation, versions)
+    return value
+
+
+def invalidate_user(user_id):
+    user_id = int(user_id)
+    with _lock:
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+        for kind in _kinds:
+            if _entries.pop((user_id, kind), None) is not None:
+                _stats['invalidated'] += 1
+
+
+def clear():
+    with _lock:
+        _stats['invalidated'] += len(_entries)
+        _entries.clear()
+
+
+def stats():
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return dict(_stats, size=len(_entries), max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS,
+                    hit_rate=_stats['hits'] / lookups if lookups else 0.0)
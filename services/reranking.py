@@ -0,0 +1,65 @@
+import numpy as np
+from services import movie_catalog
+
+# 重排序阶段：每个阶段是一个 stage(scores, catalog) 函数，按目录行号原地调整得分数组。
+# 加权/惩罚通过行号数组一次完成，不随用户反馈数量或目录规模逐行扫描
+
+LIKE_FACTOR = 1.1
+DISLIKE_FACTOR = 0.5
+
+
+def _rows(movie_ids, catalog):
+    rows = movie_catalog.rows_for_movie_ids(np.asarray(movie_ids, dtype=np.int64), catalog)
+    return rows[rows >= 0]
+
+
+def multiply_stage(movie_ids, factors):
+    # 对指定电影的得分乘以对应系数（可以是标量或与 movie_ids 等长的数组）
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    factors = np.broadcast_to(np.asarray(factors, dtype=np.float64), movie_ids.shape)
+
+    def stage(scores, catalog):
+        rows = movie_catalog.rows_for_movie_ids(movie_ids, catalog)
+        found = rows >= 0
+        # 同一部电影出现多次时系数连乘，与逐条调整的结果一致
+        np.multiply.at(scores, rows[found], factors[found])
+        return scores
+    return stage
+
+
+def feedback_stage(user_feedback, like_factor=LIKE_FACTOR, dislike_factor=DISLIKE_FACTOR):
+    feedback = user_feedback['feedback'].values
+    factors = np.where(feedback == 'like', like_factor, np.where(feedback == 'dislike', dislike_factor, 1.0))
+    return multiply_stage(user_feedback['movie_id'].values, factors)
+
+
+def favorites_stage(favorite_movie_ids, boost):
+    return multiply_stage(favorite_movie_ids, boost)
+
+
+def exclude_stage(movie_ids):
+    # 排除指定电影（已评分、业务规则屏蔽等），得分置为 -inf
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+
+    def stage(scores, catalog):
+        scores[_rows(movie_ids, catalog)] = -np.inf
+        return scores
+    return stage
+
+
+def rerank(scores, stages, catalog=None):
+    catalog = catalog or movie_catalog.get_catalog()
+    scores = np.array(scores, dtype=np.float64)
+    for stage in stages:
+        scores = stage(scores, catalog)
+    return scores
+
+
+def top_k(scores, k):
+    # 部分选择：argpartition 取前 k 个，再只对这 k 个排序；被排除的 -inf 不会返回
+    candidates = np.flatnonzero(np.isfinite(scores))
+    k = min(k, len(candidates))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return top[np.argsort(-scores[top], kind='stable')]
@@ -0,0 +1,39 @@
+import os
+import shutil
+import numpy as np
+
+# 只读数组以 .npy 文件目录的形式发布，各工作进程以内存映射方式打开，
+# 同一份数据在所有进程间共享操作系统页缓存，不会按进程复制
+
+
+def save_arrays(path, arrays):
+    # 先写到临时目录再整体改名，其他进程不会看到写了一半的目录
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # 其他进程已经发布了同一份数据（或旧目录存在），替换掉旧目录
+        if os.path.isdir(path):
+            old_path = f"{path}.old{os.getpid()}"
+            os.rename(path, old_path)
+            os.rename(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            raise
+
+
+def load_arrays(path, mmap=True):
+    arrays = {}
+    for file_name in sorted(os.listdir(path)):
+        if file_name.endswith('.npy'):
+            arrays[file_name[:-len('.npy')]] = np.load(os.path.join(path, file_name), mmap_mode='r' if mmap else None)
+    return arrays
+
+
+def arrays_exist(path):
+    return os.path.isdir(path)